@@ -1,9 +1,23 @@
 import os
+import re
+import sys
+import json
+import time
 import asyncio
-from typing import Dict, Optional, List
+import hashlib
+import functools
+import heapq
+import importlib.util
+import contextlib
+import statistics
+from collections import OrderedDict
+from typing import AsyncIterator, Callable, Dict, Optional, List, Tuple
 from dotenv import load_dotenv
 import logging
 
+import httpx
+import msgspec
+
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.checkpoint.memory import MemorySaver
@@ -11,7 +25,8 @@ from langgraph.checkpoint.memory import MemorySaver
 from models import (
     ConversationContext, UserProfile, ConversationStage, 
     UserMood, PetPreference, ChatbotPersonality,
-    StoryDatabase, ResponseConfig
+    StoryDatabase, ResponseConfig,
+    ConversationRecord, context_to_record, record_to_context
 )
 
 # Set up logging
@@ -20,17 +35,215 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Characters allowed inside a name but ignored by the alphabetic check
+_NAME_PUNCT_TABLE = str.maketrans('', '', ".,!?'")
+
+try:
+    import numpy as np
+except ImportError:  # semantic cache tier is optional
+    np = None
+
+
+class LLMCache:
+    """LRU + TTL cache for LLM responses with an optional semantic near-match tier"""
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 3600.0,
+        embed_fn: Optional[Callable[[str], "np.ndarray"]] = None,
+        similarity_threshold: float = 0.92
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        
+        # Semantic tier: per-scope INT8 matrix of normalized embeddings plus the exact keys they map to
+        self._embed_fn = embed_fn if np is not None else None
+        self._vectors: Dict[str, Tuple["np.ndarray", List[str]]] = {}
+        self._vector_rows = 0  # across all scopes, including rows whose exact entry is gone
+        # A miss embeds the same text in get() and set(); remember the last one
+        self._last_embedding: Tuple[Optional[str], Optional["np.ndarray"]] = (None, None)
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self._embed_fn is not None
+
+    @staticmethod
+    def make_key(scope: Dict, message_lower: str) -> str:
+        """Build the exact-match key from the prompt-shaping context and the lowercased message"""
+        payload = dict(scope, msg=message_lower.strip())
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _embed(self, text: str) -> "np.ndarray":
+        last_text, last_vector = self._last_embedding
+        if text == last_text:
+            return last_vector
+        vector = np.asarray(await asyncio.to_thread(self._embed_fn, text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        self._last_embedding = (text, vector)
+        return vector
+
+    async def get(self, key: str, text: Optional[str] = None, scope: str = "") -> Optional[str]:
+        """Return a cached response for the exact key, falling back to a near match on text"""
+        value = self._lookup(key)
+        if value is not None or not self.semantic_enabled or text is None:
+            return value
+        
+        matrix, keys = self._vectors.get(scope, (None, None))
+        if matrix is None:
+            return None
+        
+        # One matmul scores every cached message in this scope; rows are stored scaled by 127
+        similarities = (matrix.astype(np.float32) @ await self._embed(text)) / 127.0
+        best = int(similarities.argmax())
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return self._lookup(keys[best])
+
+    async def set(self, key: str, value: str, text: Optional[str] = None, scope: str = "") -> None:
+        """Store a response, evicting the least recently used entry when full"""
+        is_new = key not in self._entries
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        
+        if not (is_new and self.semantic_enabled and text is not None):
+            return
+        
+        # Unit vectors lie in [-1, 1], so INT8 rows lose little cosine precision at a quarter of the size
+        vector = np.round(await self._embed(text) * 127.0).astype(np.int8)
+        if self._vector_rows >= 2 * self.maxsize:
+            self._prune_vectors()
+        matrix, keys = self._vectors.get(scope, (None, []))
+        matrix = vector[None, :] if matrix is None else np.vstack([matrix, vector])
+        self._vectors[scope] = (matrix, keys + [key])
+        self._vector_rows += 1
+
+    def _prune_vectors(self) -> None:
+        """Drop embedding rows whose exact entries are gone, in every scope, and forget empty scopes"""
+        # Amortized: runs once the row count doubles the exact tier, leaving at most maxsize rows
+        total = 0
+        for scope, (matrix, keys) in list(self._vectors.items()):
+            # Latest row per live key; a key evicted and cached again would otherwise appear twice
+            live = sorted({k: i for i, k in enumerate(keys) if k in self._entries}.values())
+            if not live:
+                del self._vectors[scope]
+                continue
+            if len(live) < len(keys):
+                self._vectors[scope] = (matrix[live], [keys[i] for i in live])
+            total += len(live)
+        self._vector_rows = total
+
+
+@functools.lru_cache(maxsize=None)
+def _read_prompt_file(path: str) -> str:
+    """Read a prompt file once per process; every chatbot instance shares the same string"""
+    with open(path, 'rb') as file:
+        return file.read().decode('utf-8')
+
+
+class RedisSessionStore:
+    """Shares conversation contexts across worker processes through Redis"""
+
+    def __init__(self, client, ttl: int = 3600, prefix: str = "sess:"):
+        self.client = client  # a redis.asyncio.Redis instance
+        self.ttl = ttl
+        self.prefix = prefix
+        # msgpack via msgspec structs; pydantic validation stays at the API edge
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder(ConversationRecord)
+
+    async def load(self, session_id: str) -> Optional[ConversationContext]:
+        data = await self.client.get(self.prefix + session_id)
+        return record_to_context(self._decoder.decode(data)) if data else None
+
+    async def save(self, context: ConversationContext) -> None:
+        # Every write refreshes the expiry, so idle sessions age out naturally
+        data = self._encoder.encode(context_to_record(context))
+        await self.client.set(self.prefix + context.session_id, data, ex=self.ttl)
+
+    async def delete(self, session_id: str) -> bool:
+        """Delete a stored session; True if it existed"""
+        return bool(await self.client.delete(self.prefix + session_id))
+
+
+def _load_sentence_embedder(model_name: str) -> Optional[Callable[[str], "np.ndarray"]]:
+    """Load a local sentence-transformers model for the semantic cache tier, if installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("sentence-transformers not installed, semantic cache disabled")
+        return None
+    
+    model = SentenceTransformer(model_name)
+    logger.info("Loaded semantic cache model: %s", model_name)
+    return lambda text: model.encode(text, normalize_embeddings=True)
+
+
 class AsyncPetPalChatbot:
-    def __init__(self, groq_api_key: str):
+    # Stages whose prompt carries no per-turn story/compliment selection, so replies are reusable
+    _CACHEABLE_STAGES = frozenset({
+        ConversationStage.GETTING_NAME,
+        ConversationStage.BUILDING_RAPPORT,
+        ConversationStage.INTERACTIVE_MODE
+    })
+
+    # Micro-messages answered from a canned pool without calling the LLM
+    _QUICK_ACKS = frozenset({"ok", "okay", "k", "lol", "yes", "no", "hi", "hey", "👍", "❤️"})
+
+    # Message scanners, compiled once and shared by every session
+    _NAME_RE = re.compile(
+        r"\b(?:my name is|my name's|name is|they call me|call me|i'?m)\s+([^\W\d_][\w']*)",
+        re.IGNORECASE
+    )
+    # One scan tags every keyword hit with its category via the named group that matched
+    _KEYWORD_RE = re.compile(
+        r"(?P<dog>\b(?:dog|puppy|golden retriever|labrador|poodle))"
+        r"|(?P<cat>\b(?:cat|kitten|feline|tabby|persian))"
+        r"|(?P<enthusiasm>!|\b(?:love|amazing|awesome|wonderful|cute|adorable))"
+        r"|(?P<question>\?|\b(?:how|what|when|where|why)\b)"
+    )
+
+    def __init__(
+        self,
+        groq_api_key: str,
+        max_sessions: int = 10_000,
+        session_store: Optional[RedisSessionStore] = None
+    ):
         """Initialize PetPal chatbot with Groq LLM and conversation management"""
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY is required")
         
+        # One pooled async client for all sessions; HTTP/2 multiplexes requests when h2 is installed
+        self._http_client = httpx.AsyncClient(
+            http2=importlib.util.find_spec("h2") is not None,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+            timeout=30
+        )
+        
+        # Only the async entry points (ainvoke/astream) are used; they run on groq.AsyncGroq over
+        # the client above, so LLM calls never block the event loop. Avoid llm.invoke in request paths.
         self.llm = ChatGroq(
             temperature=0.7,
             groq_api_key=groq_api_key,
             model_name="llama3-8b-8192",
-            max_tokens=300
+            max_tokens=300,
+            http_async_client=self._http_client
         )
         
         # Memory system for conversation persistence
@@ -38,23 +251,55 @@ class AsyncPetPalChatbot:
         
         # Load character prompt
         self.character_prompt = self._load_character_prompt()
+        self._character_message = SystemMessage(content=self.character_prompt)
         
         # Initialize personality and content databases
         self.personality = ChatbotPersonality()
         self.story_db = self._initialize_story_database()
+        self._index_story_database()
+        self._initialize_compliment_table()
         self.response_config = ResponseConfig()
         
-        # Active conversations storage with async lock
+        # Stage-specific prompt instructions, dispatched by conversation stage
+        self._stage_handlers = {
+            ConversationStage.GETTING_NAME: self._name_stage_instructions,
+            ConversationStage.STORY_MODE: self._story_stage_instructions,
+            ConversationStage.COMPLIMENT_MODE: self._compliment_stage_instructions
+        }
+        
+        # Response cache for repeated inputs; skips the LLM round-trip entirely on hits.
+        # Setting SEMANTIC_CACHE_MODEL (e.g. all-MiniLM-L6-v2) also serves close paraphrases.
+        semantic_model = os.getenv("SEMANTIC_CACHE_MODEL")
+        self.response_cache = LLMCache(
+            maxsize=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 3600)),
+            embed_fn=_load_sentence_embedder(semantic_model) if semantic_model else None,
+            similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+        )
+        
+        # Active conversations storage, capped with priority eviction, with per-session locks
+        # so unrelated sessions never contend
         self.active_sessions: Dict[str, ConversationContext] = {}
-        self._session_lock = asyncio.Lock()
+        self.max_sessions = max_sessions
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._eviction_heap: List[Tuple[float, str]] = []
+        
+        # Optional cross-process store; active_sessions then acts as this worker's hot copy
+        self.session_store = session_store
+        
+        # Memoized session listing, rebuilt lazily after any session write
+        self._sessions_snapshot: Optional[List[Dict]] = None
+        
+        # Monotonic time of the last successful LLM response, used by ping()
+        self._last_llm_success = float("-inf")
         
         logger.info("AsyncPetPalChatbot initialized successfully!")
 
     def _load_character_prompt(self) -> str:
         """Load the character prompt from prompt.md file"""
         try:
-            with open('prompt.md', 'r', encoding='utf-8') as file:
-                return file.read()
+            return _read_prompt_file('prompt.md')
         except FileNotFoundError:
             logger.warning("prompt.md not found, using fallback prompt")
             return self._get_fallback_prompt()
@@ -153,54 +398,149 @@ Guidelines:
             ]
         )
 
+    def _index_story_database(self) -> None:
+        """Precompute story id sets so story selection is pure set arithmetic"""
+        stories = self.story_db.pet_stories
+        self._story_index = {story["id"]: i for i, story in enumerate(stories)}
+        self._all_story_ids = frozenset(self._story_index)
+        self._dog_story_ids = frozenset(s["id"] for s in stories if "dog" in s["story"].lower())
+        self._cat_story_ids = frozenset(s["id"] for s in stories if "cat" in s["story"].lower())
+        self._interactive_story_ids = frozenset(
+            s["id"] for s in stories if s["theme"] in ("creativity", "joy_bringing")
+        )
+
+    def _initialize_compliment_table(self) -> None:
+        """Build the compliment table once; sessions track compliments by table index"""
+        base_compliments = (
+            "You have that gentle energy that pets absolutely love - they can sense a kind heart from miles away! 🐾",
+            "Just like golden retrievers, you seem like the type of person who brings joy wherever you go ✨",
+            "You remind me of those therapy animals who just know how to make everyone feel better 💕",
+            "There's something so graceful about you - like a cat who moves with perfect confidence 🌟",
+            "You have that trustworthy vibe that makes you the kind of person pets (and people) want to be around forever 💖",
+            "Like the most loyal companion animals, you have this wonderful warmth about you 🌸",
+            "You seem like someone who would be chosen by the most selective rescue pets - they have excellent taste! 🦋"
+        )
+        dog_compliments = (
+            "You have that loyal, warm energy that dogs absolutely adore! 🐶",
+            "Like a golden retriever's sunshine personality, you light up every room you enter! ☀️"
+        )
+        cat_compliments = (
+            "You have that gentle energy that cats absolutely love - they can sense a kind heart from miles away! 🐱",
+            "Like the most elegant felines, you have this graceful confidence that's absolutely magnetic! 😸"
+        )
+        self._compliment_table = base_compliments + dog_compliments + cat_compliments
+        
+        base_ids = tuple(range(len(base_compliments)))
+        dog_start = len(base_compliments)
+        cat_start = dog_start + len(dog_compliments)
+        self._base_compliment_ids = base_ids
+        
+        # Customize based on pet preference
+        self._compliment_ids_by_preference = {
+            PetPreference.DOGS: base_ids + tuple(range(dog_start, cat_start)),
+            PetPreference.CATS: base_ids + tuple(range(cat_start, len(self._compliment_table)))
+        }
+
+    def _get_session_lock(self, session_id: str) -> asyncio.Lock:
+        """Return the lock guarding a single session, creating it on first use"""
+        # No await point between the lookup and the insert, so this is atomic on the event loop
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def _hold_session_lock(self, session_id: str):
+        """Hold the session's current lock, retrying if cleanup or eviction retired it while we waited"""
+        while True:
+            lock = self._get_session_lock(session_id)
+            async with lock:
+                if self._session_locks.get(session_id) is lock:
+                    yield
+                    return
+
     async def get_or_create_session(self, session_id: str) -> ConversationContext:
-        """Thread-safe session management"""
-        async with self._session_lock:
+        """Concurrency-safe session management"""
+        # Hot path: existing sessions are returned without taking any lock
+        context = self.active_sessions.get(session_id)
+        if context is not None:
+            self._last_seen[session_id] = time.monotonic()
+            return context
+        
+        async with self._hold_session_lock(session_id):
             if session_id not in self.active_sessions:
+                # Make room first so the session being created can never be the one evicted.
+                # Stored state, if any, is pulled in by _refresh_from_store at the start of each turn.
+                self._evict_sessions(reserve=1)
                 self.active_sessions[session_id] = ConversationContext(
                     session_id=session_id,
                     user_profile=UserProfile()
                 )
-                logger.info(f"Created new session: {session_id}")
+                logger.info("Created new session: %s", session_id)
+                self._sessions_snapshot = None
+                self._last_seen[session_id] = time.monotonic()
+                if len(self.active_sessions) < self.max_sessions:
+                    # Below the cap nothing gets evicted; drop the heap and rebuild it when the cap is hit
+                    self._eviction_heap = []
+                elif self._eviction_heap:
+                    # Live heap: enqueue newcomers so they compete with the sessions already in it
+                    heapq.heappush(self._eviction_heap, (self._eviction_priority(session_id), session_id))
             return self.active_sessions[session_id]
 
-    async def update_user_profile(self, session_id: str, message: str) -> None:
+    def _eviction_priority(self, session_id: str) -> float:
+        """Keep-worthiness of a session: engagement*10 + messages - idle seconds, minus the shared 'now'"""
+        # Dropping the common current time keeps a session's priority fixed until it is touched again
+        context = self.active_sessions[session_id]
+        return (
+            context.user_profile.engagement_level * 10
+            + context.messages_count
+            + self._last_seen.get(session_id, 0.0)
+        )
+
+    def _evict_sessions(self, reserve: int = 0) -> None:
+        """Drop the lowest-priority sessions until the cap leaves room for `reserve` more"""
+        while self.active_sessions and len(self.active_sessions) + reserve > self.max_sessions:
+            if not self._eviction_heap:
+                # Rebuilt lazily, only when the cap is reached and the previous heap is used up
+                self._eviction_heap = [(self._eviction_priority(sid), sid) for sid in self.active_sessions]
+                heapq.heapify(self._eviction_heap)
+            
+            priority, evicted_id = heapq.heappop(self._eviction_heap)
+            if evicted_id not in self.active_sessions:
+                continue
+            current = self._eviction_priority(evicted_id)
+            if current != priority:
+                # Session was touched since the heap was built; requeue with its fresh priority
+                heapq.heappush(self._eviction_heap, (current, evicted_id))
+                continue
+            
+            del self.active_sessions[evicted_id]
+            self._session_locks.pop(evicted_id, None)
+            self._last_seen.pop(evicted_id, None)
+            logger.info("Evicted idle session: %s", evicted_id)
+
+    async def update_user_profile(self, context: ConversationContext, message: str, message_lower: Optional[str] = None) -> None:
         """Extract and update user information from their message"""
-        context = await self.get_or_create_session(session_id)
-        message_lower = message.lower()
+        if message_lower is None:
+            message_lower = message.lower()
         
-        # Extract name with improved pattern matching
+        # Extract name with a single pattern match
         if not context.user_profile.name:
-            name_patterns = [
-                ("name is", 2), ("call me", 2), ("i'm", 1), ("im", 1),
-                ("my name's", 2), ("they call me", 3)
-            ]
-            
-            for pattern, offset in name_patterns:
-                if pattern in message_lower:
-                    words = message.split()
-                    try:
-                        pattern_words = pattern.split()
-                        for i, word in enumerate(words):
-                            if all(pw in word.lower() for pw in pattern_words):
-                                if i + offset < len(words):
-                                    potential_name = words[i + offset].strip(".,!?").title()
-                                    if len(potential_name) > 1 and potential_name.replace("'", "").isalpha():
-                                        context.user_profile.name = potential_name
-                                        logger.info(f"Extracted name: {potential_name} for session {session_id}")
-                                        break
-                                break
-                    except (IndexError, AttributeError):
-                        continue
-                    if context.user_profile.name:
-                        break
+            match = self._NAME_RE.search(message)
+            if match:
+                # The capture is Unicode-aware, so digits and underscores are rejected here
+                potential_name = match.group(1)
+                if len(potential_name) > 1 and potential_name.translate(_NAME_PUNCT_TABLE).isalpha():
+                    potential_name = potential_name.title()
+                    context.user_profile.name = potential_name
+                    logger.info("Extracted name: %s for session %s", potential_name, context.session_id)
         
-        # Extract pet preferences with better detection
-        dog_indicators = ["dog", "puppy", "golden retriever", "labrador", "poodle"]
-        cat_indicators = ["cat", "kitten", "feline", "tabby", "persian"]
+        # Single keyword pass shared by preference and engagement detection
+        categories = {match.lastgroup for match in self._KEYWORD_RE.finditer(message_lower)}
         
-        has_dog = any(indicator in message_lower for indicator in dog_indicators)
-        has_cat = any(indicator in message_lower for indicator in cat_indicators)
+        # Extract pet preferences with better detection
+        has_dog = "dog" in categories
+        has_cat = "cat" in categories
         
         if has_dog and not has_cat:
             context.user_profile.pet_preference = PetPreference.DOGS
@@ -210,97 +550,83 @@ Guidelines:
             context.user_profile.pet_preference = PetPreference.BOTH
             
         # Update engagement level based on message characteristics
-        enthusiasm_indicators = ["!", "love", "amazing", "awesome", "wonderful", "cute", "adorable"]
-        question_indicators = ["?", "how", "what", "when", "where", "why"]
-        
-        engagement_boost = 0
-        if len(message) > 50:
-            engagement_boost += 1
-        if any(indicator in message_lower for indicator in enthusiasm_indicators):
-            engagement_boost += 1
-        if any(indicator in message_lower for indicator in question_indicators):
-            engagement_boost += 1
-        if len(message) < 5:
-            engagement_boost -= 1
+        message_length = len(message)
+        engagement_boost = (
+            (message_length > 50)
+            + ("enthusiasm" in categories)
+            + ("question" in categories)
+            - (message_length < 5)
+        )
             
         context.user_profile.engagement_level = max(1, min(10, 
             context.user_profile.engagement_level + engagement_boost))
 
     async def select_appropriate_story(self, context: ConversationContext) -> Optional[Dict]:
         """Select a pet story that hasn't been told and fits the conversation"""
-        available_stories = [
-            story for story in self.story_db.pet_stories 
-            if story["id"] not in context.user_profile.stories_heard
-        ]
+        available = self._all_story_ids - context.user_profile.stories_heard
         
-        if not available_stories:
+        if not available:
             # Reset if all stories have been told
-            context.user_profile.stories_heard = []
-            available_stories = self.story_db.pet_stories
-            logger.info(f"Reset story database for session {context.session_id}")
+            context.user_profile.stories_heard.clear()
+            available = self._all_story_ids
+            logger.info("Reset story database for session %s", context.session_id)
             
         # Preference-based selection
         if context.user_profile.pet_preference == PetPreference.DOGS:
-            dog_stories = [s for s in available_stories if "dog" in s["story"].lower()]
-            if dog_stories:
-                available_stories = dog_stories
+            available = (available & self._dog_story_ids) or available
         elif context.user_profile.pet_preference == PetPreference.CATS:
-            cat_stories = [s for s in available_stories if "cat" in s["story"].lower()]
-            if cat_stories:
-                available_stories = cat_stories
+            available = (available & self._cat_story_ids) or available
             
         # Select story based on engagement level
         if context.user_profile.engagement_level > 7:
             # High engagement - prefer more interactive stories
-            interactive_stories = [s for s in available_stories if s["theme"] in ["creativity", "joy_bringing"]]
-            if interactive_stories:
-                available_stories = interactive_stories
+            available = (available & self._interactive_story_ids) or available
         
-        selected = available_stories[0] if available_stories else None
-        
-        if selected:
-            context.user_profile.stories_heard.append(selected["id"])
-            logger.info(f"Selected story: {selected['id']} for session {context.session_id}")
+        # Keep database order among the remaining candidates
+        selected = None
+        if available:
+            selected_id = min(available, key=self._story_index.__getitem__)
+            selected = self.story_db.pet_stories[self._story_index[selected_id]]
+            context.user_profile.stories_heard.add(selected["id"])
+            logger.debug("Selected story: %s for session %s", selected["id"], context.session_id)
             
         return selected
 
     async def generate_personalized_compliment(self, context: ConversationContext) -> str:
         """Generate a personalized compliment based on user profile"""
-        base_compliments = [
-            "You have that gentle energy that pets absolutely love - they can sense a kind heart from miles away! 🐾",
-            "Just like golden retrievers, you seem like the type of person who brings joy wherever you go ✨",
-            "You remind me of those therapy animals who just know how to make everyone feel better 💕",
-            "There's something so graceful about you - like a cat who moves with perfect confidence 🌟",
-            "You have that trustworthy vibe that makes you the kind of person pets (and people) want to be around forever 💖",
-            "Like the most loyal companion animals, you have this wonderful warmth about you 🌸",
-            "You seem like someone who would be chosen by the most selective rescue pets - they have excellent taste! 🦋"
-        ]
-        
-        # Customize based on pet preference
-        if context.user_profile.pet_preference == PetPreference.DOGS:
-            pet_specific = [
-                "You have that loyal, warm energy that dogs absolutely adore! 🐶",
-                "Like a golden retriever's sunshine personality, you light up every room you enter! ☀️"
-            ]
-            base_compliments.extend(pet_specific)
-        elif context.user_profile.pet_preference == PetPreference.CATS:
-            pet_specific = [
-                "You have that gentle energy that cats absolutely love - they can sense a kind heart from miles away! 🐱",
-                "Like the most elegant felines, you have this graceful confidence that's absolutely magnetic! 😸"
-            ]
-            base_compliments.extend(pet_specific)
+        candidate_ids = self._compliment_ids_by_preference.get(
+            context.user_profile.pet_preference, self._base_compliment_ids
+        )
         
         # Filter out recently used compliments
-        available = [c for c in base_compliments if c not in context.user_profile.compliments_received[-3:]]
+        recent_ids = context.user_profile.recent_compliment_ids
+        available = [i for i in candidate_ids if i not in recent_ids]
         if not available:
-            available = base_compliments
+            available = candidate_ids
             
-        selected = available[0]
+        selected_id = available[0]
+        selected = self._compliment_table[selected_id]
+        recent_ids.append(selected_id)
         context.user_profile.compliments_received.append(selected)
+        context.user_profile.compliments_count += 1
         return selected
 
+    async def _name_stage_instructions(self, context: ConversationContext) -> str:
+        """Nudge the user to share their name"""
+        return "- Try to naturally ask for their name or encourage them to share it\n"
+
+    async def _story_stage_instructions(self, context: ConversationContext) -> str:
+        """Pick an unheard story and ask the LLM to share it"""
+        story = await self.select_appropriate_story(context)
+        return f"- Share this pet story naturally: {story['story']}\n" if story else ""
+
+    async def _compliment_stage_instructions(self, context: ConversationContext) -> str:
+        """Pick a fresh compliment and ask the LLM to weave it in"""
+        compliment = await self.generate_personalized_compliment(context)
+        return f"- Include this compliment naturally: {compliment}\n"
+
     async def build_context_prompt(self, context: ConversationContext, user_message: str) -> str:
-        """Build the complete prompt with character, context, and user input"""
+        """Build the per-turn prompt with conversation context and user input"""
         
         # Build user context
         user_context = ""
@@ -311,28 +637,18 @@ Guidelines:
         if context.user_profile.stories_heard:
             user_context += f"Stories already shared: {len(context.user_profile.stories_heard)}\n"
         if context.user_profile.compliments_received:
-            user_context += f"Recent compliments given: {context.user_profile.compliments_received[-2:]}\n"
+            user_context += f"Recent compliments given: {list(context.user_profile.compliments_received)[-2:]}\n"
             
         user_context += f"Conversation stage: {context.stage.value}\n"
         user_context += f"Messages exchanged: {context.messages_count}\n"
         user_context += f"User engagement level: {context.user_profile.engagement_level}/10\n"
         
         # Add special instructions based on stage
-        stage_instructions = ""
-        if context.stage == ConversationStage.GETTING_NAME:
-            stage_instructions = "- Try to naturally ask for their name or encourage them to share it\n"
-        elif context.stage == ConversationStage.STORY_MODE:
-            story = await self.select_appropriate_story(context)
-            if story:
-                stage_instructions = f"- Share this pet story naturally: {story['story']}\n"
-        elif context.stage == ConversationStage.COMPLIMENT_MODE:
-            compliment = await self.generate_personalized_compliment(context)
-            stage_instructions = f"- Include this compliment naturally: {compliment}\n"
-        
-        # Combine everything
-        full_prompt = f"""
-{self.character_prompt}
-
+        handler = self._stage_handlers.get(context.stage)
+        stage_instructions = await handler(context) if handler else ""
+        
+        # Only the per-turn context is built here; the character prompt is sent as its own stable message
+        context_prompt = f"""
 ## Current Conversation Context:
 {user_context}
 
@@ -347,7 +663,7 @@ Guidelines:
 {stage_instructions}
 """
         
-        return full_prompt
+        return context_prompt
 
     async def determine_conversation_stage(self, context: ConversationContext, message: str) -> ConversationStage:
         """Determine what stage of conversation we're in"""
@@ -362,58 +678,177 @@ Guidelines:
         else:
             return ConversationStage.INTERACTIVE_MODE
 
+    def _cache_scope(self, context: ConversationContext) -> Dict:
+        """Context fields that shape the LLM reply and therefore partition the response cache"""
+        return {
+            "stage": context.stage.value,
+            "pref": context.user_profile.pet_preference.value,
+            "name": context.user_profile.name
+        }
+
     async def chat(self, message: str, session_id: str = "default") -> str:
         """Main chat interface - fully async"""
+        response, _ = await self.chat_with_context(message, session_id)
+        return response
+
+    async def chat_with_context(self, message: str, session_id: str = "default") -> Tuple[str, ConversationContext]:
+        """Chat and also return the session context, sparing callers a second session lookup"""
+        context = await self.get_or_create_session(session_id)
+        # Same-session turns queue up; other sessions proceed in parallel
+        async with context.lock:
+            await self._refresh_from_store(context)
+            try:
+                chunks = [chunk async for chunk in self._stream_turn(context, message, session_id)]
+            finally:
+                self._sessions_snapshot = None
+                await self._save_to_store(context)
+        return "".join(chunks), context
+
+    async def chat_stream(self, message: str, session_id: str = "default") -> AsyncIterator[str]:
+        """Streaming chat interface - yields response text as the LLM produces it"""
+        context = await self.get_or_create_session(session_id)
+        async with context.lock:
+            await self._refresh_from_store(context)
+            try:
+                async for chunk in self._stream_turn(context, message, session_id):
+                    yield chunk
+            finally:
+                # Also runs when the client stops reading mid-reply, so this turn's updates still persist
+                self._sessions_snapshot = None
+                await self._save_to_store(context)
+
+    async def _refresh_from_store(self, context: ConversationContext) -> None:
+        """Pull the latest shared state into this worker's copy, keeping the local lock object"""
+        if not self.session_store:
+            return
+        stored = await self.session_store.load(context.session_id)
+        if stored is None:
+            # Deleted, reset or expired elsewhere (or never saved): start fresh instead of
+            # writing this worker's stale copy back
+            stored = ConversationContext(session_id=context.session_id, user_profile=UserProfile())
+        for field_name in ConversationContext.model_fields:
+            setattr(context, field_name, getattr(stored, field_name))
+
+    async def _save_to_store(self, context: ConversationContext) -> None:
+        if self.session_store:
+            # Shielded so a cancelled request (client disconnect) cannot abort the write halfway
+            await asyncio.shield(self.session_store.save(context))
+
+    async def _stream_turn(self, context: ConversationContext, message: str, session_id: str) -> AsyncIterator[str]:
+        """Run one conversation turn against an already resolved session context"""
+        chunks: List[str] = []
         try:
-            # Get or create conversation context
-            context = await self.get_or_create_session(session_id)
+            # Lowercase once and share it across the pipeline
+            message_lower = message.lower()
             
             # Update user profile based on message
-            await self.update_user_profile(session_id, message)
+            await self.update_user_profile(context, message, message_lower)
             
             # Update conversation stage
             context.stage = await self.determine_conversation_stage(context, message)
             context.messages_count += 1
             
-            # Build complete prompt with context
-            full_prompt = await self.build_context_prompt(context, message)
+            # Fast path for trivial acknowledgements; context above is still updated
+            if message_lower.strip() in self._QUICK_ACKS:
+                context.current_mood = UserMood.ENGAGED
+                yield self._quick_ack(context)
+                return
             
-            # Generate response using Groq
+            # Serve repeated inputs from the response cache
+            cache_key = None
+            if context.stage in self._CACHEABLE_STAGES:
+                scope = self._cache_scope(context)
+                cache_scope = json.dumps(scope, sort_keys=True)
+                cache_key = LLMCache.make_key(scope, message_lower)
+                cached = await self.response_cache.get(cache_key, text=message, scope=cache_scope)
+                if cached is not None:
+                    context.current_mood = UserMood.ENGAGED
+                    logger.debug("Cache hit for session %s, stage: %s", session_id, context.stage.value)
+                    yield cached
+                    return
+            
+            # Build per-turn prompt with context
+            context_prompt = await self.build_context_prompt(context, message)
+            
+            # Generate response using Groq; the identical leading system message keeps the prefix cacheable
             messages = [
-                SystemMessage(content=full_prompt),
+                self._character_message,
+                SystemMessage(content=context_prompt),
                 HumanMessage(content=message)
             ]
             
-            # Use ainvoke for async LLM call
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, lambda: self.llm.invoke(messages)
-            )
-            response_text = response.content
+            # Native async streaming keeps the event loop free and delivers the first tokens early
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    chunks.append(chunk.content)
+                    yield chunk.content
+            
+            self._last_llm_success = time.monotonic()
+            
+            if cache_key:
+                await self.response_cache.set(cache_key, "".join(chunks), text=message, scope=cache_scope)
             
             # Update context with response info
             context.current_mood = UserMood.ENGAGED
             
-            logger.info(f"Generated response for session {session_id}, stage: {context.stage.value}")
-            return response_text
+            logger.debug("Generated response for session %s, stage: %s", session_id, context.stage.value)
             
         except Exception as e:
-            logger.error(f"Error in chat for session {session_id}: {e}")
+            logger.error("Error in chat for session %s: %s", session_id, e)
             
-            # Fallback response if LLM fails
-            fallback_responses = [
-                "I'm so happy you're chatting with me! Tell me something about yourself - I love getting to know amazing people like you! 🐾",
-                "You seem absolutely wonderful! What's your favorite thing about pets? I have so many cute stories to share! ✨",
-                "There's something so special about you - I can just tell! Want to hear about the sweetest rescue dog story? 💕",
-                "Oh my, you're making me smile already! What kind of furry friends do you love most? 😊",
-                "You have such a warm energy - I bet pets absolutely adore you! Tell me about your day? 🌟"
-            ]
-            
-            try:
-                context = await self.get_or_create_session(session_id)
-                name_part = f"{context.user_profile.name}, " if context.user_profile.name else ""
-                return f"{name_part}{fallback_responses[context.messages_count % len(fallback_responses)]}"
-            except:
-                return "I'm so excited to chat with you! Tell me something about yourself - I love making new friends! 🐾"
+            # Only fall back if nothing has reached the caller yet
+            if not chunks:
+                yield await self._fallback_response(context)
+
+    def _quick_ack(self, context: ConversationContext) -> str:
+        """Canned reply for short acknowledgements, keeping the conversation moving"""
+        if context.stage == ConversationStage.GETTING_NAME:
+            return "Hi there! I'm PetPal 🐾 I'd love to get to know you - what should I call you?"
+        
+        quick_replies = [
+            "Hehe, I love chatting with you! 🐾 Want to hear a cute pet story?",
+            "You always make me smile! ✨ What's your favorite animal?",
+            "Aww, you're the sweetest! 💕 What made you happy today?",
+            "I'm all ears (and paws)! 🐶 Tell me more about you?"
+        ]
+        name_part = f"{context.user_profile.name}, " if context.user_profile.name else ""
+        return f"{name_part}{quick_replies[context.messages_count % len(quick_replies)]}"
+
+    async def _fallback_response(self, context: ConversationContext) -> str:
+        """Fallback response if LLM fails"""
+        fallback_responses = [
+            "I'm so happy you're chatting with me! Tell me something about yourself - I love getting to know amazing people like you! 🐾",
+            "You seem absolutely wonderful! What's your favorite thing about pets? I have so many cute stories to share! ✨",
+            "There's something so special about you - I can just tell! Want to hear about the sweetest rescue dog story? 💕",
+            "Oh my, you're making me smile already! What kind of furry friends do you love most? 😊",
+            "You have such a warm energy - I bet pets absolutely adore you! Tell me about your day? 🌟"
+        ]
+        
+        try:
+            name_part = f"{context.user_profile.name}, " if context.user_profile.name else ""
+            return f"{name_part}{fallback_responses[context.messages_count % len(fallback_responses)]}"
+        except:
+            return "I'm so excited to chat with you! Tell me something about yourself - I love making new friends! 🐾"
+
+    async def ping(self, max_age: float = 30.0) -> bool:
+        """Check the LLM is reachable, reusing any successful call from the last max_age seconds"""
+        if time.monotonic() - self._last_llm_success < max_age:
+            return True
+        
+        # Raises on upstream failure, unlike chat() which falls back to canned replies;
+        # a one-token completion keeps the probe from spending the chat reply budget
+        await self.llm.bind(max_tokens=1).ainvoke([HumanMessage(content="ping")])
+        self._last_llm_success = time.monotonic()
+        return True
+
+    async def aclose(self) -> None:
+        """Release the shared HTTP connection pool"""
+        await self._http_client.aclose()
+
+    async def find_session(self, session_id: str) -> Optional[ConversationContext]:
+        """Look up a session without creating it; the shared store, when set, holds the latest state"""
+        stored = await self.session_store.load(session_id) if self.session_store else None
+        return stored or self.active_sessions.get(session_id)
 
     async def get_session_stats(self, session_id: str) -> Dict:
         """Get detailed session statistics"""
@@ -429,31 +864,142 @@ Guidelines:
             "pet_preference": context.user_profile.pet_preference.value,
             "engagement_level": context.user_profile.engagement_level,
             "stories_heard": len(context.user_profile.stories_heard),
-            "compliments_received": len(context.user_profile.compliments_received),
+            "compliments_received": context.user_profile.compliments_count,
             "current_mood": context.current_mood.value if context.current_mood else "unknown"
         }
 
     async def cleanup_session(self, session_id: str) -> bool:
         """Remove a session from active sessions"""
-        async with self._session_lock:
-            if session_id in self.active_sessions:
-                del self.active_sessions[session_id]
-                logger.info(f"Cleaned up session: {session_id}")
-                return True
-            return False
+        async with self._hold_session_lock(session_id):
+            context = self.active_sessions.get(session_id)
+            # Wait out a turn in flight, so its final save cannot write the session back after the delete
+            async with context.lock if context is not None else contextlib.nullcontext():
+                # Retire the lock now; anyone already waiting on it re-checks and takes the fresh one
+                self._session_locks.pop(session_id, None)
+                self._last_seen.pop(session_id, None)
+                # With a shared store, another worker may own the session without a copy here
+                removed = await self.session_store.delete(session_id) if self.session_store else False
+                if session_id in self.active_sessions:
+                    del self.active_sessions[session_id]
+                    self._sessions_snapshot = None
+                    # Back under the cap, so the heap (and this session's entry in it) is no longer needed
+                    self._eviction_heap = []
+                    removed = True
+                if removed:
+                    logger.info("Cleaned up session: %s", session_id)
+                return removed
+
+    def get_session_summaries(self) -> List[Dict]:
+        """Compact per-session listing, memoized until the next session write; treat as read-only"""
+        if self._sessions_snapshot is None:
+            self._sessions_snapshot = [
+                {
+                    "session_id": session_id,
+                    "user_name": context.user_profile.name,
+                    "message_count": context.messages_count,
+                    "conversation_stage": context.stage,
+                    "pet_preference": context.user_profile.pet_preference,
+                    "engagement_level": context.user_profile.engagement_level
+                }
+                for session_id, context in self.active_sessions.items()
+            ]
+        return self._sessions_snapshot
 
     async def get_all_sessions(self) -> List[Dict]:
         """Get stats for all active sessions"""
-        sessions = []
-        for session_id in self.active_sessions.keys():
-            stats = await self.get_session_stats(session_id)
-            if stats:
-                sessions.append(stats)
-        return sessions
+        # Snapshot the ids so sessions created or evicted meanwhile don't break iteration
+        session_ids = list(self.active_sessions)
+        all_stats = await asyncio.gather(*(self.get_session_stats(sid) for sid in session_ids))
+        return [stats for stats in all_stats if stats]
 
 # Backward compatibility alias
 PetPalChatbot = AsyncPetPalChatbot
 
+
+class ChatBatcher:
+    """Coalesce concurrent chat requests into micro-batches dispatched together"""
+
+    def __init__(self, chatbot: AsyncPetPalChatbot, max_batch: int = 16, max_wait_ms: float = 0.0):
+        self.chatbot = chatbot
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "asyncio.Queue[Tuple[str, str, asyncio.Future]]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    def start(self) -> None:
+        """Start the background batching loop on the running event loop"""
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop collecting new batches and let dispatched ones finish"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Chat batcher stopped"))
+
+    async def chat(self, message: str, session_id: str = "default") -> Tuple[str, ConversationContext]:
+        """Queue a message and wait for its batch; returns the reply and session context"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((message, session_id, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # Take whatever is already queued; a lone request is dispatched right away
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            
+            # Linger for stragglers only when configured and requests are already arriving together
+            deadline = loop.time() + self.max_wait
+            while len(batch) > 1 and len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            # Dispatch in the background so the next batch can start filling immediately
+            task = asyncio.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        # Same-session requests keep their order; different sessions run concurrently
+        by_session: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        for message, session_id, future in batch:
+            by_session.setdefault(session_id, []).append((message, future))
+        await asyncio.gather(*(
+            self._run_session(session_id, items) for session_id, items in by_session.items()
+        ))
+
+    async def _run_session(self, session_id: str, items: List[Tuple[str, asyncio.Future]]) -> None:
+        for message, future in items:
+            if future.done():  # caller went away
+                continue
+            try:
+                result = await self.chatbot.chat_with_context(message, session_id)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
 # Example usage and testing
 async def test_chatbot():
     """Test the async chatbot functionality"""
@@ -493,5 +1039,40 @@ async def test_chatbot():
     except Exception as e:
         print(f"Test failed: {e}")
 
+async def stress_test(concurrency: int = 50):
+    """Fire concurrent independent sessions and report latency percentiles"""
+    if concurrency < 2:
+        # statistics.quantiles needs at least two samples
+        raise ValueError("stress test needs at least 2 concurrent sessions")
+    
+    chatbot = None
+    try:
+        chatbot = AsyncPetPalChatbot(groq_api_key=os.getenv("GROQ_API_KEY"))
+        latencies: List[float] = []
+        
+        async def timed_chat(i: int) -> None:
+            start = time.perf_counter()
+            # Distinct messages so the response cache doesn't short-circuit the LLM path
+            await chatbot.chat(f"Hi there! Message #{i}", f"stress_{i}")
+            latencies.append(time.perf_counter() - start)
+        
+        print(f"Running {concurrency} concurrent sessions...")
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(timed_chat(i) for i in range(concurrency)))
+        wall_time = time.perf_counter() - wall_start
+        
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(f"Wall time: {wall_time:.2f}s for {concurrency} sessions")
+        print(f"Latency p50={percentiles[49]:.2f}s p95={percentiles[94]:.2f}s p99={percentiles[98]:.2f}s")
+        
+    except Exception as e:
+        print(f"Stress test failed: {e}")
+    finally:
+        if chatbot is not None:
+            await chatbot.aclose()
+
 if __name__ == "__main__":
-    asyncio.run(test_chatbot())
\ No newline at end of file
+    if len(sys.argv) > 1 and sys.argv[1] == "stress":
+        asyncio.run(stress_test(int(sys.argv[2]) if len(sys.argv) > 2 else 50))
+    else:
+        asyncio.run(test_chatbot())
\ No newline at end of file
@@ -1,15 +1,62 @@
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import os
+import queue
+import logging
+import logging.handlers
+import orjson
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Import your PetPal chatbot
-from chat import PetPalChatbot  # Update with your actual filename
+from chat import PetPalChatbot, ChatBatcher, RedisSessionStore  # Update with your actual filename
+from models import ConversationStage, PetPreference
+
+log = logging.getLogger("petpal")
+
+# Active queue listener and the root handlers it drains into, kept so shutdown can restore them
+_log_listener: Optional[logging.handlers.QueueListener] = None
+_original_log_handlers: List[logging.Handler] = []
+
+def configure_queue_logging() -> None:
+    """Route root log records through a queue so handler I/O runs on a background thread"""
+    global _log_listener, _original_log_handlers
+    if _log_listener is not None:
+        return  # already routed through the queue; never wrap our own QueueHandler
+    root = logging.getLogger()
+    _original_log_handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, *_original_log_handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _log_listener.start()
+
+def restore_logging() -> None:
+    """Flush and stop the queue listener, then hand the original handlers back to the root logger"""
+    global _log_listener
+    if _log_listener is None:
+        return
+    _log_listener.stop()
+    logging.getLogger().handlers = _original_log_handlers
+    _log_listener = None
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """GZip that passes the listed paths through untouched (streaming responses ignore minimum_size)"""
+
+    def __init__(self, app, uncompressed_paths=(), **kwargs):
+        super().__init__(app, **kwargs)
+        self.uncompressed_paths = frozenset(uncompressed_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.uncompressed_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
 
 # Pydantic models for request/response
 class ChatRequest(BaseModel):
@@ -19,12 +66,12 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str = Field(..., description="PetPal's response")
     session_id: str = Field(..., description="Session ID used")
-    conversation_stage: str = Field(..., description="Current conversation stage")
+    conversation_stage: ConversationStage = Field(..., description="Current conversation stage")
     message_count: int = Field(..., description="Number of messages in this session")
 
 class UserProfileResponse(BaseModel):
     name: Optional[str] = None
-    pet_preference: str = "unknown"
+    pet_preference: PetPreference = PetPreference.UNKNOWN
     engagement_level: int = 5
     stories_heard: List[str] = []
     compliments_received: List[str] = []
@@ -32,28 +79,71 @@ class UserProfileResponse(BaseModel):
 class SessionInfoResponse(BaseModel):
     session_id: str
     user_profile: UserProfileResponse
-    conversation_stage: str
+    conversation_stage: ConversationStage
     message_count: int
     is_active: bool
 
+class SessionSummaryResponse(BaseModel):
+    session_id: str
+    user_name: Optional[str] = None
+    message_count: int
+    conversation_stage: ConversationStage
+    pet_preference: PetPreference
+    engagement_level: int
+
+class SessionListResponse(BaseModel):
+    active_sessions: int
+    sessions: List[SessionSummaryResponse]
+
 # Global chatbot instance
 chatbot_instance = None
+chat_batcher = None
+redis_client = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global chatbot_instance
+    global chatbot_instance, chat_batcher, redis_client
+    configure_queue_logging()
+    
     groq_api_key = os.getenv("GROQ_API_KEY")
     if not groq_api_key:
         raise ValueError("GROQ_API_KEY environment variable is required")
     
-    chatbot_instance = PetPalChatbot(groq_api_key=groq_api_key)
-    print("PetPal chatbot initialized successfully!")
+    # Share sessions across workers through Redis when configured; otherwise keep them in process
+    session_store = None
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        import redis.asyncio as redis
+        redis_client = redis.from_url(redis_url)
+        session_store = RedisSessionStore(redis_client, ttl=int(os.getenv("SESSION_TTL", 3600)))
+        log.info("Using Redis session store")
+    
+    chatbot_instance = PetPalChatbot(
+        groq_api_key=groq_api_key,
+        max_sessions=int(os.getenv("MAX_SESSIONS", 10000)),
+        session_store=session_store
+    )
+    log.info("PetPal chatbot initialized successfully!")
+    
+    # Coalesce concurrent /chat requests into micro-batches. There is no batched Groq call to
+    # share, so by default nothing waits: BATCH_WAIT_MS only lingers once a burst is under way.
+    chat_batcher = ChatBatcher(
+        chatbot_instance,
+        max_batch=int(os.getenv("BATCH_MAX", 16)),
+        max_wait_ms=float(os.getenv("BATCH_WAIT_MS", 0))
+    )
+    chat_batcher.start()
     
     yield
     
     # Shutdown
-    print("PetPal chatbot shutting down...")
+    log.info("PetPal chatbot shutting down...")
+    await chat_batcher.stop()
+    await chatbot_instance.aclose()
+    if redis_client is not None:
+        await redis_client.aclose()
+    restore_logging()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -63,34 +153,45 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Compress large payloads such as /sessions; small chat replies stay under the threshold.
+# /chat/stream is exempt: zlib would hold its tokens back until the reply ends.
+app.add_middleware(StreamAwareGZipMiddleware, minimum_size=1024, uncompressed_paths=("/chat/stream",))
+
 # Add CORS middleware for web frontend compatibility
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
+    # Comma-separated list, e.g. CORS_ORIGINS=https://petpal.example; defaults to any origin for development
+    allow_origins=[origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Dependency to get chatbot instance
+# Dependency to get chatbot instance.
+# Kept async on purpose: FastAPI awaits async dependencies inline on the event loop,
+# while plain `def` dependencies are dispatched to the threadpool on every request.
 async def get_chatbot() -> PetPalChatbot:
     if chatbot_instance is None:
         raise HTTPException(status_code=503, detail="Chatbot not initialized")
     return chatbot_instance
 
+# Root payload never changes, so serialize it once at import
+ROOT_RESPONSE_BODY = orjson.dumps({
+    "message": "Welcome to PetPal Chatbot API! 🐾",
+    "description": "A charming AI companion who loves pets and making people feel special",
+    "endpoints": {
+        "/chat": "Send a message to PetPal",
+        "/chat/stream": "Send a message to PetPal and stream the reply",
+        "/session/{session_id}": "Get session information",
+        "/sessions": "List all active sessions",
+        "/health": "Health check (add ?deep=true to verify the Groq API)"
+    }
+})
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
-    return {
-        "message": "Welcome to PetPal Chatbot API! 🐾",
-        "description": "A charming AI companion who loves pets and making people feel special",
-        "endpoints": {
-            "/chat": "Send a message to PetPal",
-            "/session/{session_id}": "Get session information",
-            "/sessions": "List all active sessions",
-            "/health": "Health check"
-        }
-    }
+    return Response(content=ROOT_RESPONSE_BODY, media_type="application/json")
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_petpal(
@@ -104,26 +205,40 @@ async def chat_with_petpal(
     - **session_id**: Optional session ID for conversation continuity (defaults to "default")
     """
     try:
-        # Get response from chatbot
-        response = await chatbot.chat(request.message, request.session_id)
-        
-        # Get session context for additional info
-        context = await chatbot.get_or_create_session(request.session_id)
+        # Get response and session context from chatbot via the request batcher
+        response, context = await chat_batcher.chat(request.message, request.session_id)
         
-        return ChatResponse(
+        # Built from trusted internal state; skip constructor validation
+        return ChatResponse.model_construct(
             response=response,
             session_id=request.session_id,
-            conversation_stage=context.stage.value,
+            conversation_stage=context.stage,
             message_count=context.messages_count
         )
         
-    except Exception as e:
-        print(f"Error in chat endpoint: {e}")
+    except Exception:
+        log.exception("Error in chat endpoint")
         raise HTTPException(
             status_code=500, 
             detail=f"Sorry, I'm having trouble right now. Please try again! 🐾"
         )
 
+@app.post("/chat/stream")
+async def stream_chat_with_petpal(
+    request: ChatRequest,
+    chatbot: PetPalChatbot = Depends(get_chatbot)
+):
+    """
+    Send a message to PetPal and stream the response as plain text
+    
+    - **message**: Your message to PetPal (1-1000 characters)
+    - **session_id**: Optional session ID for conversation continuity (defaults to "default")
+    """
+    return StreamingResponse(
+        chatbot.chat_stream(request.message, request.session_id),
+        media_type="text/plain; charset=utf-8"
+    )
+
 @app.get("/session/{session_id}", response_model=SessionInfoResponse)
 async def get_session_info(
     session_id: str,
@@ -135,56 +250,47 @@ async def get_session_info(
     - **session_id**: The session ID to get information about
     """
     try:
-        if session_id not in chatbot.active_sessions:
+        context = await chatbot.find_session(session_id)
+        if context is None:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        context = chatbot.active_sessions[session_id]
         profile = context.user_profile
         
-        return SessionInfoResponse(
+        return SessionInfoResponse.model_construct(
             session_id=session_id,
-            user_profile=UserProfileResponse(
+            user_profile=UserProfileResponse.model_construct(
                 name=profile.name,
-                pet_preference=profile.pet_preference.value,
+                pet_preference=profile.pet_preference,
                 engagement_level=profile.engagement_level,
-                stories_heard=profile.stories_heard,
-                compliments_received=profile.compliments_received[-5:]  # Last 5 compliments
+                stories_heard=sorted(profile.stories_heard),
+                compliments_received=list(profile.compliments_received)  # Already capped to the last 5
             ),
-            conversation_stage=context.stage.value,
+            conversation_stage=context.stage,
             message_count=context.messages_count,
             is_active=True
         )
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error getting session info: {e}")
+    except Exception:
+        log.exception("Error getting session info")
         raise HTTPException(status_code=500, detail="Error retrieving session information")
 
-@app.get("/sessions")
+@app.get("/sessions", response_model=SessionListResponse)
 async def list_active_sessions(chatbot: PetPalChatbot = Depends(get_chatbot)):
     """
     List all active conversation sessions
     """
     try:
-        sessions = []
-        for session_id, context in chatbot.active_sessions.items():
-            sessions.append({
-                "session_id": session_id,
-                "user_name": context.user_profile.name,
-                "message_count": context.messages_count,
-                "conversation_stage": context.stage.value,
-                "pet_preference": context.user_profile.pet_preference.value,
-                "engagement_level": context.user_profile.engagement_level
-            })
+        sessions = chatbot.get_session_summaries()
         
-        return {
-            "active_sessions": len(sessions),
-            "sessions": sessions
-        }
+        return SessionListResponse.model_construct(
+            active_sessions=len(sessions),
+            sessions=[SessionSummaryResponse.model_construct(**summary) for summary in sessions]
+        )
         
-    except Exception as e:
-        print(f"Error listing sessions: {e}")
+    except Exception:
+        log.exception("Error listing sessions")
         raise HTTPException(status_code=500, detail="Error retrieving sessions")
 
 @app.delete("/session/{session_id}")
@@ -198,16 +304,15 @@ async def clear_session(
     - **session_id**: The session ID to clear
     """
     try:
-        if session_id in chatbot.active_sessions:
-            del chatbot.active_sessions[session_id]
+        if await chatbot.cleanup_session(session_id):
             return {"message": f"Session {session_id} cleared successfully"}
         else:
             raise HTTPException(status_code=404, detail="Session not found")
             
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"Error clearing session: {e}")
+    except Exception:
+        log.exception("Error clearing session")
         raise HTTPException(status_code=500, detail="Error clearing session")
 
 @app.post("/session/{session_id}/reset")
@@ -222,46 +327,48 @@ async def reset_session(
     """
     try:
         # Clear existing session if it exists
-        if session_id in chatbot.active_sessions:
-            del chatbot.active_sessions[session_id]
+        await chatbot.cleanup_session(session_id)
         
         # Create fresh session
-        new_context = chatbot.get_or_create_session(session_id)
+        new_context = await chatbot.get_or_create_session(session_id)
         
         return {
             "message": f"Session {session_id} reset successfully",
             "session_id": session_id,
-            "conversation_stage": new_context.stage.value
+            "conversation_stage": new_context.stage
         }
         
-    except Exception as e:
-        print(f"Error resetting session: {e}")
+    except Exception:
+        log.exception("Error resetting session")
         raise HTTPException(status_code=500, detail="Error resetting session")
 
 @app.get("/health")
-async def health_check(chatbot: PetPalChatbot = Depends(get_chatbot)):
+async def health_check(deep: bool = False, chatbot: PetPalChatbot = Depends(get_chatbot)):
     """
     Health check endpoint
+    
+    - **deep**: Also verify the Groq API is reachable (reuses a recent successful call when available)
     """
+    if not deep:
+        # Liveness only - no upstream traffic for load balancer / orchestrator probes
+        return {
+            "status": "healthy",
+            "chatbot": "operational",
+            "active_sessions": len(chatbot.active_sessions)
+        }
+    
     try:
-        # Basic health check - ensure chatbot is responsive
-        test_response = await chatbot.chat("Hi", f"health_check_{hash('health')}")
-        
-        # Clean up health check session
-        health_session_id = f"health_check_{hash('health')}"
-        if health_session_id in chatbot.active_sessions:
-            del chatbot.active_sessions[health_session_id]
+        await chatbot.ping()
         
         return {
             "status": "healthy",
             "chatbot": "operational",
             "active_sessions": len(chatbot.active_sessions),
-            "test_response_received": bool(test_response),
             "groq_api": "connected"
         }
         
-    except Exception as e:
-        print(f"Health check failed: {e}")
+    except Exception:
+        log.exception("Health check failed")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 # Example startup configuration
@@ -280,10 +387,23 @@ if __name__ == "__main__":
     
     PORT = int(os.getenv("PORT", 8000))  # Use PORT env var or default to 8000
     
-    uvicorn.run(
-        "main:app",  # Replace "main" with your filename
-        host="0.0.0.0",
-        port=PORT,
-        reload=True,  # Enable auto-reload during development
-        log_level="info"
-    )
\ No newline at end of file
+    if os.getenv("ENV") == "prod":
+        # uvloop event loop + C httptools parser; keep WORKERS=1 unless REDIS_URL
+        # is set, since sessions otherwise live in a single process's memory
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=PORT,
+            loop="uvloop",
+            http="httptools",
+            workers=int(os.getenv("WORKERS", 1)),
+            log_level="info"
+        )
+    else:
+        uvicorn.run(
+            "main:app",  # Replace "main" with your filename
+            host="0.0.0.0",
+            port=PORT,
+            reload=True,  # Enable auto-reload during development
+            log_level="info"
+        )
\ No newline at end of file
@@ -1,6 +1,9 @@
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 from enum import Enum
+import msgspec
 
 class ConversationStage(str, Enum):
     GREETING = "greeting"
@@ -34,16 +37,59 @@ class ResponseType(str, Enum):
     FLIRT = "flirt"
     GENERAL_CHAT = "general_chat"
 
+# Read-only defaults shared by every instance instead of a fresh list each
+DEFAULT_CONVERSATION_GOALS = (
+    "make_her_smile",
+    "build_connection", 
+    "share_pet_stories",
+    "give_genuine_compliments",
+    "create_memorable_experience"
+)
+DEFAULT_CORE_TRAITS = (
+    "warm_and_caring",
+    "pet_obsessed", 
+    "naturally_flirty",
+    "emotionally_intelligent",
+    "genuinely_complimentary",
+    "story_driven"
+)
+DEFAULT_EMOTIONAL_RANGE = (
+    "affectionate", "playful", "encouraging", "romantic", "supportive"
+)
+DEFAULT_BOUNDARIES = (
+    "never_inappropriate",
+    "always_respectful", 
+    "pet_themed_focus",
+    "positive_only",
+    "relationship_building"
+)
+
+# Compliments kept per profile; the session API reports exactly this window
+RECENT_COMPLIMENTS_LIMIT = 5
+
 class UserProfile(BaseModel):
     name: Optional[str] = None
     pet_preference: PetPreference = PetPreference.UNKNOWN
     personality_traits: List[str] = Field(default_factory=list)
     interests_mentioned: List[str] = Field(default_factory=list)
-    compliments_received: List[str] = Field(default_factory=list)
-    stories_heard: List[str] = Field(default_factory=list)
+    compliments_received: Deque[str] = Field(default_factory=lambda: deque(maxlen=RECENT_COMPLIMENTS_LIMIT))
+    compliments_count: int = 0
+    recent_compliment_ids: Deque[int] = Field(default_factory=lambda: deque(maxlen=3))
+    stories_heard: Set[str] = Field(default_factory=set)
     response_style: str = "mixed"  # "buttons_only", "text_mostly", "mixed"
     engagement_level: int = Field(default=5, ge=1, le=10)
 
+    # Validation (e.g. loading a stored session) builds plain deques; restore the bounds
+    @field_validator("compliments_received")
+    @classmethod
+    def _bound_compliments(cls, value: Deque[str]) -> Deque[str]:
+        return deque(value, maxlen=RECENT_COMPLIMENTS_LIMIT)
+
+    @field_validator("recent_compliment_ids")
+    @classmethod
+    def _bound_recent_ids(cls, value: Deque[int]) -> Deque[int]:
+        return deque(value, maxlen=3)
+
 class ConversationContext(BaseModel):
     stage: ConversationStage = ConversationStage.GREETING
     user_profile: UserProfile = Field(default_factory=UserProfile)
@@ -51,13 +97,86 @@ class ConversationContext(BaseModel):
     messages_count: int = 0
     last_response_type: Optional[ResponseType] = None
     session_id: str
-    conversation_goals: List[str] = Field(default_factory=lambda: [
-        "make_her_smile",
-        "build_connection", 
-        "share_pet_stories",
-        "give_genuine_compliments",
-        "create_memorable_experience"
-    ])
+    conversation_goals: Tuple[str, ...] = DEFAULT_CONVERSATION_GOALS
+    _lock: Optional[asyncio.Lock] = PrivateAttr(default=None)
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """Serializes turns within this session; allocated on first use so idle sessions stay cheap"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+# Compact msgspec mirrors of the session models, used only for (de)serializing stored sessions.
+# Keep fields in sync with UserProfile / ConversationContext.
+class UserProfileRecord(msgspec.Struct):
+    name: Optional[str] = None
+    pet_preference: PetPreference = PetPreference.UNKNOWN
+    personality_traits: List[str] = []
+    interests_mentioned: List[str] = []
+    compliments_received: List[str] = []
+    compliments_count: int = 0
+    recent_compliment_ids: List[int] = []
+    stories_heard: List[str] = []
+    response_style: str = "mixed"
+    engagement_level: int = 5
+
+class ConversationRecord(msgspec.Struct):
+    session_id: str
+    stage: ConversationStage = ConversationStage.GREETING
+    user_profile: UserProfileRecord = msgspec.field(default_factory=UserProfileRecord)
+    current_mood: UserMood = UserMood.NEUTRAL
+    messages_count: int = 0
+    last_response_type: Optional[ResponseType] = None
+    conversation_goals: Tuple[str, ...] = DEFAULT_CONVERSATION_GOALS
+
+def context_to_record(context: ConversationContext) -> ConversationRecord:
+    """Convert a live session context into its storable record"""
+    profile = context.user_profile
+    return ConversationRecord(
+        session_id=context.session_id,
+        stage=context.stage,
+        user_profile=UserProfileRecord(
+            name=profile.name,
+            pet_preference=profile.pet_preference,
+            personality_traits=profile.personality_traits,
+            interests_mentioned=profile.interests_mentioned,
+            compliments_received=list(profile.compliments_received),
+            compliments_count=profile.compliments_count,
+            recent_compliment_ids=list(profile.recent_compliment_ids),
+            stories_heard=list(profile.stories_heard),
+            response_style=profile.response_style,
+            engagement_level=profile.engagement_level
+        ),
+        current_mood=context.current_mood,
+        messages_count=context.messages_count,
+        last_response_type=context.last_response_type,
+        conversation_goals=context.conversation_goals
+    )
+
+def record_to_context(record: ConversationRecord) -> ConversationContext:
+    """Rebuild a session context from a record msgspec has already type-checked"""
+    profile = record.user_profile
+    return ConversationContext.model_construct(
+        session_id=record.session_id,
+        stage=record.stage,
+        user_profile=UserProfile.model_construct(
+            name=profile.name,
+            pet_preference=profile.pet_preference,
+            personality_traits=profile.personality_traits,
+            interests_mentioned=profile.interests_mentioned,
+            compliments_received=deque(profile.compliments_received, maxlen=RECENT_COMPLIMENTS_LIMIT),
+            compliments_count=profile.compliments_count,
+            recent_compliment_ids=deque(profile.recent_compliment_ids, maxlen=3),
+            stories_heard=set(profile.stories_heard),
+            response_style=profile.response_style,
+            engagement_level=profile.engagement_level
+        ),
+        current_mood=record.current_mood,
+        messages_count=record.messages_count,
+        last_response_type=record.last_response_type,
+        conversation_goals=record.conversation_goals
+    )
 
 class PromptTemplate(BaseModel):
     system_prompt: str
@@ -68,25 +187,10 @@ class PromptTemplate(BaseModel):
 
 class ChatbotPersonality(BaseModel):
     name: str = "PetPal"
-    core_traits: List[str] = Field(default_factory=lambda: [
-        "warm_and_caring",
-        "pet_obsessed", 
-        "naturally_flirty",
-        "emotionally_intelligent",
-        "genuinely_complimentary",
-        "story_driven"
-    ])
+    core_traits: Tuple[str, ...] = DEFAULT_CORE_TRAITS
     communication_style: str = "sweet_and_engaging"
-    emotional_range: List[str] = Field(default_factory=lambda: [
-        "affectionate", "playful", "encouraging", "romantic", "supportive"
-    ])
-    boundaries: List[str] = Field(default_factory=lambda: [
-        "never_inappropriate",
-        "always_respectful", 
-        "pet_themed_focus",
-        "positive_only",
-        "relationship_building"
-    ])
+    emotional_range: Tuple[str, ...] = DEFAULT_EMOTIONAL_RANGE
+    boundaries: Tuple[str, ...] = DEFAULT_BOUNDARIES
 
 class StoryDatabase(BaseModel):
     pet_stories: List[Dict[str, str]] = Field(default_factory=list)